@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+.gitignore生成的热点代码，单独成模块以便用mypyc编译为C扩展：
+
+    pip install mypy
+    mypyc svn2git_fast.py
+
+编译生成的扩展模块与本文件同名，会被优先导入；未编译时直接使用本文件，行为一致。
+"""
+
+import itertools
+from typing import BinaryIO, Dict, Iterable, List
+
+
+# 将反斜杠统一转换为/
+_SLASH_TABLE = str.maketrans({'\\': '/'})
+
+
+def write_gitignore(ignore_configs: Iterable[tuple[str, str]], fp: BinaryIO) -> None:
+    """
+    将SVN ignore配置转换为.gitignore格式，逐行以UTF-8写入二进制文件对象，统一路径分隔符为/
+    
+    Args:
+        ignore_configs: (相对路径, svn:ignore属性值)序列
+        fp: 以二进制模式打开的输出文件
+    """
+    configs = iter(ignore_configs)
+    first = next(configs, None)
+    if first is None:
+        return
+    second = next(configs, None)
+    if second is None and first[0] == '.':
+        # 非递归的常见情况：只有根目录的配置，无需拼接路径，整体编码为一段
+        content = '\n'.join(p for p in map(str.strip, first[1].splitlines()) if p and not p.startswith('#'))
+        if content:
+            fp.write(f"{content}\n".encode('utf-8'))
+        return
+    
+    # 相同的svn:ignore内容只解析一次：按内容分组，保持首次出现的顺序
+    groups: Dict[str, List[str]] = {}
+    for path, config in itertools.chain([first, second] if second else [first], configs):
+        groups.setdefault(config, []).append(path)
+    
+    for config, paths in groups.items():
+        # 先统一过滤空行和注释行
+        patterns = [p for p in map(str.strip, config.splitlines()) if p and not p.startswith('#')]
+        
+        # 统一路径分隔符为/
+        norm_paths = [p.translate(_SLASH_TABLE) for p in paths if p != '.']
+        if len(norm_paths) != len(paths):
+            fp.writelines(f"{pattern}\n".encode('utf-8') for pattern in patterns)
+        if not norm_paths:
+            continue
+        
+        fp.write(f"\n# {', '.join(norm_paths)} 目录的忽略规则\n".encode('utf-8'))
+        rel_patterns = [pattern.translate(_SLASH_TABLE).lstrip('/') for pattern in patterns]
+        for norm_path in norm_paths:
+            fp.writelines(f"{norm_path}/{pattern}\n".encode('utf-8') for pattern in rel_patterns)
@@ -2,90 +2,147 @@
 # -*- coding: utf-8 -*-
 
 import os
+import itertools
+import locale
 import subprocess
+import tempfile
 import click
 import fnmatch
-from typing import List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, Optional, Set, Tuple
 import time
 import re
+from functools import lru_cache
+from svn2git_fast import write_gitignore
+import xml.etree.ElementTree as ET
 
 
-def get_svn_ignore(path: str) -> Optional[str]:
+# 写出.gitignore时的缓冲区大小，减少write系统调用次数
+_WRITE_BUFFER_SIZE = 1 << 20
+# 所有svn调用的公共参数：禁止交互式提示，避免隐藏的提示使工具挂起
+_SVN_GLOBAL_OPTIONS = ['--non-interactive']
+
+
+@lru_cache(maxsize=None)
+def _compile_ignore(config: str) -> Tuple[frozenset, Optional['re.Pattern[str]']]:
     """
-    获取指定路径的svn:ignore属性值
+    将一个目录的svn:ignore内容编译为匹配器，匹配规则等价于fnmatch.fnmatch
     
     Args:
-        path: 目标路径
+        config: svn:ignore属性值
         
     Returns:
-        str: svn:ignore属性值，如果不存在则返回None
+        tuple: (纯"*.ext"后缀集合, 其余模式合并后的正则，无则为None)
     """
-    try:
-        result = subprocess.run(
-            ['svn', 'propget', 'svn:ignore', path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout.strip() if result.stdout.strip() else None
-    except subprocess.CalledProcessError:
-        return None
-
-
-def get_all_svn_ignores(base_path: str) -> dict:
+    suffixes = set()
+    regexes = []
+    for pattern in config.splitlines():
+        pattern = os.path.normcase(pattern.strip())
+        if not pattern:
+            continue
+        if pattern.startswith('*.') and not any(c in pattern[1:] for c in '*?['):
+            suffixes.add(pattern[1:])
+        else:
+            regexes.append(fnmatch.translate(pattern))
+    regex = re.compile('|'.join(regexes)) if regexes else None
+    return frozenset(suffixes), regex
+
+
+def _match_ignore(config: str, name: str) -> bool:
+    """
+    判断名称是否被svn:ignore内容忽略，name需已经过os.path.normcase处理
+    """
+    suffixes, regex = _compile_ignore(config)
+    if suffixes:
+        # 依次检查每个"."开始的后缀，集合查找为O(1)
+        i = name.find('.')
+        while i != -1:
+            if name[i:] in suffixes:
+                return True
+            i = name.find('.', i + 1)
+    return regex is not None and regex.match(name) is not None
+
+
+class SvnError(Exception):
+    """svn命令执行失败"""
+
+
+class NotWorkingCopyError(SvnError):
+    """路径不是有效的SVN工作副本（svn错误码E155007）"""
+
+
+def get_all_svn_ignores(base_path: str, recursive: bool = True) -> Dict[str, str]:
     """
-    一次性获取所有目录的svn:ignore属性，返回{绝对路径: 属性内容}字典，适配"路径 - 忽略项"格式
+    一次性获取所有目录的svn:ignore属性，返回{绝对路径: 属性内容}字典
+    
+    流式解析svn propget --xml的输出，边接收边解析，避免等待svn全部输出完毕
+    
+    Args:
+        base_path: 目标路径
+        recursive: 是否递归获取子目录（svn propget -R），否则只获取目标路径本身
+        
+    Returns:
+        dict: 属性字典
+        
+    Raises:
+        NotWorkingCopyError: 目标路径不是有效的SVN工作副本
+        SvnError: svn propget执行失败，错误信息包含svn输出的最后一行错误
     """
     ignores = {}
-    try:
-        result = subprocess.run(
-            ['svn', 'propget', 'svn:ignore', '-R', base_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        lines = result.stdout.splitlines()
-        current_dir = None
-        current_ignores = []
-        dir_line_pattern = re.compile(r'^(.*) - (.+)$')
-        for line in lines:
-            if not line.strip():
-                continue
-            m = dir_line_pattern.match(line)
-            if m:
-                # 保存上一个目录
-                if current_dir and current_ignores:
-                    ignores[current_dir] = '\n'.join(current_ignores).strip()
-                # 新目录
-                current_dir = m.group(1).strip()
-                abs_dir = os.path.abspath(current_dir)
-                current_dir = abs_dir
-                current_ignores = [m.group(2).strip()]
-            else:
-                if current_dir is not None:
-                    current_ignores.append(line.strip())
-        # 保存最后一个目录
-        if current_dir and current_ignores:
-            ignores[current_dir] = '\n'.join(current_ignores).strip()
-    except subprocess.CalledProcessError:
-        pass
+    args = ['svn', *_SVN_GLOBAL_OPTIONS, 'propget', 'svn:ignore', '--xml']
+    if recursive:
+        args.append('-R')
+    args.append(base_path)
+    # stderr写入临时文件而非管道，避免svn错误输出过多时阻塞stdout的读取
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr_file)
+        assert proc.stdout is not None
+        parsed = True
+        try:
+            root: Optional[ET.Element] = None
+            for event, elem in ET.iterparse(proc.stdout, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    continue
+                if elem.tag != 'target':
+                    continue
+                for prop in elem.iter('property'):
+                    if prop.get('name') == 'svn:ignore' and prop.text and prop.text.strip():
+                        ignores[os.path.abspath(elem.get('path'))] = prop.text.strip()
+                # 已解析的target不再需要，及时释放
+                if root is not None:
+                    root.clear()
+        except ET.ParseError:
+            # svn中途出错时输出的XML不完整
+            parsed = False
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode(locale.getpreferredencoding(False), errors='replace')
+            if 'E155007' in stderr:
+                raise NotWorkingCopyError(base_path)
+            lines = [line.strip() for line in stderr.splitlines() if line.strip()]
+            reason = lines[-1] if lines else f"退出码 {returncode}"
+            raise SvnError(f"{'svn propget -R' if recursive else 'svn propget'} 执行失败: {reason}")
+    if not parsed:
+        raise SvnError("svn propget 输出的XML不完整")
     return ignores
 
 
-def process_directory(path: str, recursive: bool = False, max_depth: int = 0, threads: int = 4) -> List[tuple[str, str]]:
+def process_directory(path: str, recursive: bool = False, max_depth: int = 0) -> Iterator[tuple[str, str]]:
     """
     使用批量获取的方式，极大提升收集效率
+    
+    以生成器形式逐个产出(相对路径, svn:ignore属性值)，不构建中间结果列表
     """
-    results = []
     base_path = os.path.abspath(path)
     if not recursive:
-        ignore_config = get_svn_ignore(path)
+        ignore_config = get_all_svn_ignores(path, recursive=False).get(base_path)
         if ignore_config:
-            rel_path = os.path.relpath(path, base_path)
-            rel_path = '.' if rel_path == '.' else rel_path
-            results.append((rel_path, ignore_config))
-        return results
+            yield '.', ignore_config
+        return
 
     # 统计收集目录耗时
     t0 = time.time()
@@ -97,66 +154,45 @@ def process_directory(path: str, recursive: bool = False, max_depth: int = 0, th
     t2 = time.time()
     # 剪枝：跳过被父目录ignore的目录
     # 先按路径深度排序，保证父目录先处理
-    sorted_dirs = sorted(all_ignores.keys(), key=lambda d: d.count(os.sep))
+    sep = os.sep
+    # 所有目录都位于base_path之下，直接切片得到相对路径，用分隔符数量之差得到深度
+    base_root = base_path.rstrip(sep)
+    base_prefix_len = len(base_root) + 1
+    base_depth = base_root.count(sep)
+    depth_of = {d: d.count(sep) - base_depth for d in all_ignores}
+    sorted_dirs = sorted(all_ignores, key=depth_of.__getitem__)
+    # 已确定被忽略（pruned）或保留（kept）的目录，含中间目录；子目录直接继承父目录的结论
+    pruned: Set[str] = set()
+    kept = {base_path}
     for idx, d in enumerate(sorted_dirs, 1):
-        rel_path = os.path.relpath(d, base_path)
-        rel_path = '.' if rel_path == '.' else rel_path
-        # 计算递归深度
-        if rel_path == '.':
-            depth = 0
-        else:
-            depth = rel_path.count(os.sep) + 1
-        if max_depth > 0 and depth > max_depth:
+        if max_depth > 0 and depth_of[d] > max_depth:
             continue
-        # 检查是否被父目录ignore
-        parent = os.path.dirname(d)
-        skip = False
-        while parent and parent != d and parent.startswith(base_path):
-            if parent in all_ignores:
-                parent_patterns = [p.strip() for p in all_ignores[parent].splitlines() if p.strip()]
-                if any(fnmatch.fnmatch(os.path.basename(d), pat) for pat in parent_patterns):
-                    skip = True
-                    break
+        rel_path = d[base_prefix_len:] or '.'
+        # 检查是否被父目录ignore：向上找到第一个已有结论的祖先，再自顶向下继承结论
+        # 所有目录都位于base_path之下，向上走到base_path（已在kept中）必然终止
+        chain = []
+        parent = d
+        while parent not in kept and parent not in pruned:
+            chain.append(parent)
             new_parent = os.path.dirname(parent)
             if new_parent == parent:
                 break
             parent = new_parent
+        skip = parent in pruned
+        for child in reversed(chain):
+            if not skip:
+                parent = os.path.dirname(child)
+                skip = parent in all_ignores and _match_ignore(
+                    all_ignores[parent], os.path.normcase(os.path.basename(child)))
+            (pruned if skip else kept).add(child)
         if skip:
             continue
         click.echo(f"[{idx}/{len(sorted_dirs)}] 处理: {rel_path}")
         ignore_config = all_ignores[d]
         if ignore_config:
-            results.append((rel_path, ignore_config))
+            yield rel_path, ignore_config
     t3 = time.time()
     click.echo(f"递归处理耗时：{t3-t2:.2f} 秒")
-    return results
-
-
-def convert_to_gitignore(ignore_configs: List[tuple[str, str]]) -> str:
-    """
-    将SVN ignore配置转换为.gitignore格式，统一路径分隔符为/
-    """
-    gitignore_content = []
-    
-    for path, config in ignore_configs:
-        # 统一路径分隔符为/
-        norm_path = path.replace(os.sep, '/') if path != '.' else '.'
-        if norm_path != '.':
-            gitignore_content.append(f"\n# {norm_path} 目录的忽略规则")
-        
-        for pattern in config.splitlines():
-            pattern = pattern.strip()
-            if not pattern or pattern.startswith('#'):
-                continue
-                
-            if norm_path == '.':
-                gitignore_content.append(pattern)
-            else:
-                # 路径和模式拼接后统一分隔符
-                combined = f"{norm_path}/{pattern}".replace('\\', '/').replace('//', '/')
-                gitignore_content.append(combined)
-    
-    return '\n'.join(gitignore_content)
 
 
 @click.group()
@@ -170,34 +206,32 @@ def cli():
 @click.option('--recursive', '-r', is_flag=True, help='递归处理子目录')
 @click.option('--output-file', '-o', type=click.Path(), default='.gitignore', help='输出文件路径（默认：.gitignore）')
 @click.option('--max-depth', type=int, default=0, help='递归的最大深度（0为不限制）')
-@click.option('--threads', type=int, default=4, help='并行线程数（最大10，默认4）')
-def convert(path: str, recursive: bool, output_file: str, max_depth: int, threads: int):
+@click.option('--threads', type=int, default=None, hidden=True, help='已废弃，不再生效')
+def convert(path: str, recursive: bool, output_file: str, max_depth: int, threads: Optional[int]):
     """将指定目录的SVN ignore配置转换为.gitignore格式"""
-    try:
-        subprocess.run(['svn', 'info', path], capture_output=True, check=True)
-    except subprocess.CalledProcessError:
-        click.echo(f"错误: {path} 不是有效的SVN工作副本", err=True)
-        return
-    
+    if threads is not None:
+        click.echo("警告: --threads 已废弃且不再生效，每次运行只调用一次svn propget", err=True)
     click.echo(f"正在处理目录: {path}")
     if recursive:
         click.echo("启用递归处理子目录")
         if max_depth > 0:
             click.echo(f"递归最大深度: {max_depth}")
-        if threads > 10:
-            threads = 10
-        click.echo(f"并行线程数: {threads}")
-    
-    ignore_configs = process_directory(path, recursive, max_depth, threads)
     
-    if not ignore_configs:
+    ignore_configs = process_directory(path, recursive, max_depth)
+    try:
+        first = next(ignore_configs, None)
+    except NotWorkingCopyError:
+        click.echo(f"错误: {path} 不是有效的SVN工作副本", err=True)
+        return
+    except SvnError as e:
+        click.echo(f"错误: {e}", err=True)
+        return
+    if first is None:
         click.echo("未找到任何svn:ignore配置")
         return
     
-    gitignore_content = convert_to_gitignore(ignore_configs)
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(gitignore_content)
+    with open(output_file, 'wb', buffering=_WRITE_BUFFER_SIZE) as f:
+        write_gitignore(itertools.chain([first], ignore_configs), f)
     
     click.echo(f"已成功将svn:ignore配置转换并保存到: {output_file}")
 